@@ -4,211 +4,476 @@ Database tests for subscription database service
 Compatible with Python 3.13 - no psycopg2 dependency required
 """
 
+import mmap
 import os
+import queue
+import re
+import shutil
 import subprocess
+import threading
 import time
+from collections import defaultdict
+from types import SimpleNamespace
 import pytest
 
+# Integration tests shell out to both docker and docker-compose
+DOCKER_AVAILABLE = shutil.which("docker") is not None and shutil.which("docker-compose") is not None
+
+
+@pytest.fixture(scope="session")
+def repo_files():
+    """Collect repository file paths with one directory read per directory"""
+    files = set()
+    for directory in (".", "scripts"):
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.is_file():
+                    files.add(os.path.normpath(os.path.join(directory, entry.name)).replace(os.sep, "/"))
+    return files
+
+
+# Each file is read by its own fixture, so a missing or empty file only fails
+# the tests that need it
+@pytest.fixture(scope="session")
+def init_sql():
+    """Map scripts/init.sql read-only for the whole session"""
+    with open("scripts/init.sql", "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            pytest.fail("scripts/init.sql is empty")
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    yield mapped
+    mapped.close()
+
+
+def strip_sql(sql):
+    """Split SQL into (code without comments, code without comments or string literals)"""
+    code = []
+    ddl = []
+    pos = 0
+    for token in TestDatabaseSchema.PAT_SQL_TOKEN.finditer(sql):
+        code.append(sql[pos:token.start()])
+        ddl.append(sql[pos:token.start()])
+        text = token.group(0)
+        if text.startswith((b"--", b"/*")):
+            code.append(b" ")
+            ddl.append(b" ")
+        elif text.startswith(b'"'):
+            code.append(text)
+            ddl.append(text)
+        else:
+            code.append(text)
+            ddl.append(b"''")
+        pos = token.end()
+    code.append(sql[pos:])
+    ddl.append(sql[pos:])
+    return b"".join(code), b"".join(ddl)
+
+
+@pytest.fixture(scope="session")
+def schema(init_sql):
+    """Index the DDL once so each schema test is a set/list lookup"""
+    # Comments are dropped and literals blanked once, so keywords inside
+    # either can neither create nor hide a statement
+    code, ddl = strip_sql(init_sql)
+    tables = set()
+    fks = []
+    for create in TestDatabaseSchema.PAT_CREATE_TABLE.finditer(ddl):
+        table = create.group(1).lower()
+        tables.add(table)
+        for fk in TestDatabaseSchema.PAT_FOREIGN_KEY.finditer(create.group(2)):
+            fks.append((table,) + tuple(name.lower() for name in fk.groups()))
+    inserts = {m.group(1).lower() for m in TestDatabaseSchema.PAT_INSERT_INTO.finditer(ddl)}
+    return SimpleNamespace(code=code, tables=tables, fks=fks, inserts=inserts)
+
+
+@pytest.fixture(scope="session")
+def dockerfile():
+    """Read the Dockerfile once for the whole session"""
+    with open("Dockerfile", "rb") as f:
+        return f.read()
+
+
+@pytest.fixture(scope="session")
+def compose():
+    """Read docker-compose.yml once for the whole session"""
+    with open("docker-compose.yml", "rb") as f:
+        return f.read()
+
 
 class TestDatabaseSchema:
     """Unit tests for database schema validation - no database connection required"""
     
-    def test_init_sql_file_exists(self):
+    # Patterns compiled once and matched against raw bytes. PAT_SQL_TOKEN finds
+    # comments, string literals (including dollar-quoted) and quoted names so
+    # strip_sql can remove comments and blank literals before the statement
+    # patterns run; nested /* */ comments are not handled.
+    # IDENT accepts plain, "quoted" and schema-qualified names and captures the
+    # bare name; quoted names containing spaces or escaped quotes are not handled
+    PAT_SQL_TOKEN = re.compile(
+        rb"--[^\n]*|/\*.*?\*/|'(?:[^']|'')*'|\$(\w*)\$.*?\$\1\$|\"(?:[^\"]|\"\")*\"",
+        re.DOTALL
+    )
+    IDENT = rb'(?:"?\w+"?\.)?"?(\w+)"?'
+    PAT_CREATE_TABLE = re.compile(
+        rb"\bCREATE\s+TABLE\s+(?:IF\s+NOT\s+EXISTS\s+)?" + IDENT + rb"\s*\((.*?)\)\s*;",
+        re.IGNORECASE | re.DOTALL
+    )
+    PAT_FOREIGN_KEY = re.compile(
+        rb'\bFOREIGN\s+KEY\s*\(\s*"?(\w+)"?\s*\)\s*REFERENCES\s+' + IDENT + rb'\s*\(\s*"?(\w+)"?\s*\)',
+        re.IGNORECASE
+    )
+    PAT_INSERT_INTO = re.compile(rb"\bINSERT\s+INTO\s+" + IDENT, re.IGNORECASE)
+    PAT_SAMPLE_PRODUCT = re.compile(rb"Harvard\s+Business\s+Review", re.IGNORECASE)
+    PAT_FROM_POSTGRES = re.compile(rb"^\s*FROM\s+postgres\b", re.IGNORECASE | re.MULTILINE)
+    PAT_COPY_INIT_SQL = re.compile(rb"^\s*COPY\s+scripts/init\.sql\b", re.IGNORECASE | re.MULTILINE)
+    PAT_POSTGRES = re.compile(rb"postgres", re.IGNORECASE)
+    
+    def test_init_sql_file_exists(self, repo_files):
         """Test that the init.sql file exists"""
-        assert os.path.exists("scripts/init.sql"), "scripts/init.sql file should exist"
+        assert "scripts/init.sql" in repo_files, "scripts/init.sql file should exist"
     
-    def test_init_sql_contains_products_table(self):
+    def test_init_sql_contains_products_table(self, schema):
         """Test that init.sql contains products table definition"""
-        with open("scripts/init.sql", "r") as f:
-            content = f.read().upper()
-            assert "CREATE TABLE" in content, "Should contain CREATE TABLE statements"
-            assert "PRODUCTS" in content, "Should contain products table definition"
+        assert b"products" in schema.tables, "Should contain products table definition"
     
-    def test_init_sql_contains_orders_table(self):
+    def test_init_sql_contains_orders_table(self, schema):
         """Test that init.sql contains orders table definition"""
-        with open("scripts/init.sql", "r") as f:
-            content = f.read().upper()
-            assert "ORDERS" in content, "Should contain orders table definition"
+        assert b"orders" in schema.tables, "Should contain orders table definition"
     
-    def test_init_sql_contains_foreign_key(self):
+    def test_init_sql_contains_foreign_key(self, schema):
         """Test that init.sql contains foreign key relationship"""
-        with open("scripts/init.sql", "r") as f:
-            content = f.read().upper()
-            assert "FOREIGN KEY" in content, "Should contain foreign key constraint"
-            assert "REFERENCES" in content, "Should reference parent table"
+        assert (b"orders", b"product_id", b"products", b"id") in schema.fks, \
+            "orders.product_id should reference products.id"
     
-    def test_init_sql_contains_sample_data(self):
+    def test_init_sql_contains_sample_data(self, schema):
         """Test that init.sql contains sample data inserts"""
-        with open("scripts/init.sql", "r") as f:
-            content = f.read().upper()
-            assert "INSERT INTO" in content, "Should contain INSERT statements"
-            assert "HARVARD BUSINESS REVIEW" in content, "Should contain sample product data"
-    
-    def test_dockerfile_exists(self):
-        """Test that Dockerfile exists and contains PostgreSQL"""
-        assert os.path.exists("Dockerfile"), "Dockerfile should exist"
+        assert {b"products", b"orders"} <= schema.inserts, "Should insert sample products and orders"
+        assert self.PAT_SAMPLE_PRODUCT.search(schema.code), "Should contain sample product data"
+    
+    def test_dockerfile_exists(self, repo_files):
+        """Test that Dockerfile exists"""
+        assert "Dockerfile" in repo_files, "Dockerfile should exist"
+    
+    def test_dockerfile_contents(self, dockerfile):
+        """Test that Dockerfile builds on PostgreSQL and ships init.sql"""
+        assert self.PAT_FROM_POSTGRES.search(dockerfile), "Should use PostgreSQL base image"
+        assert self.PAT_COPY_INIT_SQL.search(dockerfile), "Should copy init.sql"
+    
+    def test_docker_compose_exists(self, repo_files):
+        """Test that docker-compose.yml exists"""
+        assert "docker-compose.yml" in repo_files, "docker-compose.yml should exist"
+    
+    def test_docker_compose_contents(self, compose):
+        """Test that docker-compose.yml is properly configured"""
+        assert self.PAT_POSTGRES.search(compose), "Should contain postgres service"
+        assert b"5432" in compose, "Should expose PostgreSQL port"
+
+
+@pytest.fixture(scope="session")
+def db_ready():
+    """Wait for the database once per test session, backing off between probes"""
+    max_retries = 30
+    
+    # Check if database is running and accessible, starting immediately
+    for i in range(max_retries):
+        try:
+            # The container healthcheck is the cheapest signal - no exec needed
+            result = subprocess.run([
+                "docker", "inspect", "-f", "{{.State.Health.Status}}", "subscription-db"
+            ], capture_output=True, timeout=10)
+            
+            if result.stdout.strip() == b"healthy":
+                return True
+            
+            # The healthcheck only runs every 30s, so probe directly until then
+            result = subprocess.run([
+                "docker-compose", "-f", "docker-compose.yml", 
+                "exec", "-T", "postgres", 
+                "pg_isready", "-U", "dbuser", "-d", "subscriptions"
+            ], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, timeout=10)
+            
+            if result.returncode == 0:
+                return True
+                
+        except (subprocess.TimeoutExpired, subprocess.SubprocessError):
+            pass
         
-        with open("Dockerfile", "r") as f:
-            content = f.read().upper()
-            assert "FROM POSTGRES" in content, "Should use PostgreSQL base image"
-            assert "COPY SCRIPTS/INIT.SQL" in content, "Should copy init.sql"
-    
-    def test_docker_compose_exists(self):
-        """Test that docker-compose.yml exists and is properly configured"""
-        assert os.path.exists("docker-compose.yml"), "docker-compose.yml should exist"
+        # Exponential backoff: 0.25s, 0.5s, 1s, then 2s per retry
+        time.sleep(0.25 * 2 ** min(i, 3))
+    
+    return False
+
+
+def psql_command():
+    """Build the psql command, connecting over TCP when DB_HOST and a local psql are available"""
+    psql = ["psql", "-X", "-q", "-A", "-t"]
+    
+    # CI sets DB_HOST/DB_PORT; talking libpq straight to the mapped port skips docker-compose exec.
+    # Credentials come from the same environment, with the docker-compose.yml values as defaults
+    if os.environ.get("DB_HOST") and shutil.which("psql"):
+        return psql + [
+            "-U", os.environ.get("POSTGRES_USER", "dbuser"),
+            "-d", os.environ.get("POSTGRES_DB", "subscriptions"),
+            "-h", os.environ["DB_HOST"], "-p", os.environ.get("DB_PORT", "5432"),
+        ]
+    
+    return ["docker-compose", "-f", "docker-compose.yml", "exec", "-T", "postgres"] + psql + [
+        "-U", "dbuser", "-d", "subscriptions"
+    ]
+
+
+class QueryResult:
+    """psql output split into "|"-separated rows and everything else"""
+    
+    def __init__(self, lines):
+        self.rows = [tuple(line.split(b"|")) for line in lines if b"|" in line]
+        # Errors and notices have no "|"; keep them for assertion messages
+        self.messages = [line.decode(errors="replace") for line in lines if b"|" not in line]
         
-        with open("docker-compose.yml", "r") as f:
-            content = f.read()
-            assert "postgres" in content.lower(), "Should contain postgres service"
-            assert "5432" in content, "Should expose PostgreSQL port"
+        # Rows grouped by their first column: "label|value" rows give
+        # {label: [(value,)]}, "table|column|..." rows give {table: [(column, ...)]}
+        self.grouped = defaultdict(list)
+        for key, *rest in self.rows:
+            self.grouped[key].append(tuple(rest))
+    
+    def value(self, label):
+        """Return the value of a "label|value" row, or None if psql did not print it"""
+        values = self.grouped.get(label)
+        return values[0][0] if values else None
+    
+    def explain(self, message):
+        """Append any non-row psql output to an assertion message"""
+        if not self.messages:
+            return message
+        return message + "\npsql output:\n" + "\n".join(self.messages)
 
 
-class TestDatabaseIntegration:
-    """Integration tests that require running database"""
+class PsqlSession:
+    """A single psql process kept open for the whole test session"""
     
-    @classmethod
-    def setup_class(cls):
-        """Setup for integration tests - wait for database to be available"""
-        cls.max_retries = 30
-        cls.db_ready = False
+    SENTINEL = b"---END---"
+    TIMEOUT = 30
+    
+    def __init__(self):
+        env = dict(os.environ, PGPASSWORD=os.environ.get("POSTGRES_PASSWORD", "dbpassword"))
+        self.process = subprocess.Popen(
+            psql_command(), env=env,
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.STDOUT
+        )
         
-        # Check if database is running and accessible
-        for i in range(cls.max_retries):
+        # Read on a background thread so query() can time out on pipes, portably
+        self.output = queue.Queue()
+        self.broken = None
+        threading.Thread(target=self._read_output, daemon=True).start()
+    
+    def _read_output(self):
+        """Forward psql output lines to the queue, then None at EOF"""
+        for line in self.process.stdout:
+            self.output.put(line.rstrip(b"\n"))
+        self.output.put(None)
+    
+    def _fail_exited(self, lines=()):
+        """Fail with psql's exit code and whatever it printed before exiting"""
+        self.process.wait(timeout=10)
+        lines = [line.decode(errors="replace") for line in lines]
+        while True:
             try:
-                result = subprocess.run([
-                    "docker-compose", "-f", "docker-compose.yml", 
-                    "exec", "-T", "postgres", 
-                    "pg_isready", "-U", "dbuser", "-d", "subscriptions"
-                ], capture_output=True, text=True, timeout=10)
-                
-                if result.returncode == 0:
-                    cls.db_ready = True
-                    break
-                    
-            except (subprocess.TimeoutExpired, subprocess.SubprocessError):
-                pass
-            
-            time.sleep(2)
+                line = self.output.get(timeout=1)
+            except queue.Empty:
+                break
+            if line is None:
+                break
+            lines.append(line.decode(errors="replace"))
+        pytest.fail(f"psql exited with code {self.process.returncode}:\n" + "\n".join(lines))
     
-    def test_database_connection(self):
-        """Test that database is accessible"""
-        if not TestDatabaseIntegration.db_ready:
-            pytest.skip("Database not available for integration tests")
+    def query(self, sql):
+        """Send SQL to psql and return its output as a QueryResult"""
+        # After a timeout psql's late output would be read as the next answer
+        if self.broken:
+            pytest.fail(f"psql session is unusable: {self.broken}")
+        if self.process.poll() is not None:
+            self._fail_exited()
         
-        result = subprocess.run([
-            "docker-compose", "-f", "docker-compose.yml",
-            "exec", "-T", "postgres",
-            "pg_isready", "-U", "dbuser", "-d", "subscriptions"
-        ], capture_output=True, text=True)
+        try:
+            self.process.stdin.write(sql.encode() + b"\n\\echo " + self.SENTINEL + b"\n")
+            self.process.stdin.flush()
+        except BrokenPipeError:
+            self._fail_exited()
         
-        assert result.returncode == 0, "Database should be accessible"
+        lines = []
+        deadline = time.monotonic() + self.TIMEOUT
+        while True:
+            try:
+                line = self.output.get(timeout=max(deadline - time.monotonic(), 0))
+            except queue.Empty:
+                self.broken = f"an earlier query timed out after {self.TIMEOUT}s"
+                self.process.kill()
+                pytest.fail(f"psql did not answer within {self.TIMEOUT}s; output so far:\n"
+                            + "\n".join(line.decode(errors="replace") for line in lines))
+            if line is None:
+                self._fail_exited(lines)
+            if line == self.SENTINEL:
+                break
+            lines.append(line)
+        return QueryResult(lines)
+    
+    def close(self):
+        """Close stdin so psql exits, then reap the process"""
+        try:
+            self.process.stdin.close()
+        except BrokenPipeError:
+            pass
+        self.process.wait(timeout=10)
+
+
+@pytest.fixture(scope="session")
+def psql(db_ready):
+    """Open one psql session shared by every integration test"""
+    if not db_ready:
+        pytest.skip("Database not available for integration tests")
+    
+    session = PsqlSession()
+    yield session
+    session.close()
+
+
+# Checks sent to psql as one script; each row is "label|value". table_exists
+# is prepared in the same round-trip so both lookups share one parse (PostgreSQL
+# still plans each of the first executions); DEALLOCATE ALL first keeps the
+# script rerunnable in one session. The foreign key probe runs in a DO block,
+# so the bad insert never commits
+DB_CHECKS_SQL = """
+DEALLOCATE ALL;
+PREPARE table_exists(text) AS
+    SELECT $1 || '_exists', COUNT(*) FROM information_schema.tables WHERE table_name = $1;
+EXECUTE table_exists('products');
+EXECUTE table_exists('orders');
+SELECT 'products_count', COUNT(*) FROM products;
+SELECT 'orders_count', COUNT(*) FROM orders;
+DO $$
+BEGIN
+    INSERT INTO orders (product_id, quantity, total_price) VALUES (999, 1, 10.00);
+    RAISE EXCEPTION 'fk_not_enforced';
+EXCEPTION WHEN foreign_key_violation THEN
+    PERFORM set_config('db_checks.fk_violation', 'raised', false);
+END$$;
+SELECT 'fk_violation', current_setting('db_checks.fk_violation', true);
+"""
+
+
+@pytest.fixture(scope="session")
+def db_checks(psql):
+    """Run the table, row-count and foreign key checks in a single round-trip"""
+    return psql.query(DB_CHECKS_SQL)
+
+
+# Foreign keys as "table|column|foreign_table|foreign_column" rows
+FK_CONSTRAINTS_SQL = """
+SELECT tc.table_name, kcu.column_name, ccu.table_name, ccu.column_name
+FROM information_schema.table_constraints tc
+JOIN information_schema.key_column_usage kcu
+    ON tc.constraint_name = kcu.constraint_name AND tc.table_schema = kcu.table_schema
+JOIN information_schema.constraint_column_usage ccu
+    ON tc.constraint_name = ccu.constraint_name AND tc.table_schema = ccu.table_schema
+WHERE tc.constraint_type = 'FOREIGN KEY';
+"""
+
+
+@pytest.fixture(scope="session")
+def fk_constraints(psql):
+    """Fetch every foreign key once per session for FK tests to filter"""
+    return psql.query(FK_CONSTRAINTS_SQL)
+
+
+# Columns as "table|column|data_type|is_nullable" rows for both tables at once
+TABLE_COLUMNS_SQL = """
+SELECT table_name, column_name, data_type, is_nullable
+FROM information_schema.columns
+WHERE table_name IN ('products', 'orders')
+ORDER BY table_name, ordinal_position;
+"""
+
+PRODUCTS_COLUMNS = [
+    (b"id", b"integer", b"NO"),
+    (b"publication_name", b"character varying", b"NO"),
+    (b"price_per_month", b"numeric", b"YES"),
+    (b"price_per_year", b"numeric", b"YES"),
+    (b"description", b"text", b"YES"),
+    (b"created_at", b"timestamp without time zone", b"YES"),
+]
+
+ORDERS_COLUMNS = [
+    (b"id", b"integer", b"NO"),
+    (b"product_id", b"integer", b"NO"),
+    (b"quantity", b"integer", b"NO"),
+    (b"total_price", b"numeric", b"NO"),
+    (b"status", b"character varying", b"YES"),
+    (b"created_at", b"timestamp without time zone", b"YES"),
+]
+
+
+@pytest.fixture(scope="session")
+def table_columns(psql):
+    """Fetch the columns of every table under test in one query, keyed by table"""
+    return psql.query(TABLE_COLUMNS_SQL)
+
+
+@pytest.mark.skipif(not DOCKER_AVAILABLE, reason="docker and docker-compose not available")
+class TestDatabaseIntegration:
+    """Integration tests that require running database"""
     
-    def test_products_table_created(self):
+    def test_database_connection(self, db_ready):
+        """Test that database is accessible"""
+        assert db_ready, "Database did not become ready while waiting in db_ready"
+    
+    def test_products_table_created(self, db_checks):
         """Test that products table was created successfully"""
-        if not TestDatabaseIntegration.db_ready:
-            pytest.skip("Database not available for integration tests")
-        
-        # Query to check if products table exists
-        sql_query = """
-        SELECT COUNT(*) FROM information_schema.tables 
-        WHERE table_name = 'products';
-        """
-        
-        result = subprocess.run([
-            "docker-compose", "-f", "docker-compose.yml",
-            "exec", "-T", "postgres",
-            "psql", "-U", "dbuser", "-d", "subscriptions", 
-            "-c", sql_query
-        ], capture_output=True, text=True)
-        
-        assert result.returncode == 0, "Query should execute successfully"
-        assert "1" in result.stdout, "Products table should exist"
+        assert db_checks.value(b"products_exists") == b"1", db_checks.explain("Products table should exist")
     
-    def test_orders_table_created(self):
+    def test_orders_table_created(self, db_checks):
         """Test that orders table was created successfully"""
-        if not TestDatabaseIntegration.db_ready:
-            pytest.skip("Database not available for integration tests")
-        
-        sql_query = """
-        SELECT COUNT(*) FROM information_schema.tables 
-        WHERE table_name = 'orders';
-        """
-        
-        result = subprocess.run([
-            "docker-compose", "-f", "docker-compose.yml",
-            "exec", "-T", "postgres",
-            "psql", "-U", "dbuser", "-d", "subscriptions",
-            "-c", sql_query
-        ], capture_output=True, text=True)
-        
-        assert result.returncode == 0, "Query should execute successfully"
-        assert "1" in result.stdout, "Orders table should exist"
+        assert db_checks.value(b"orders_exists") == b"1", db_checks.explain("Orders table should exist")
+    
+    @pytest.mark.parametrize("table,expected_columns", [
+        (b"products", PRODUCTS_COLUMNS),
+        (b"orders", ORDERS_COLUMNS),
+    ])
+    def test_table_columns(self, table_columns, table, expected_columns):
+        """Test that each table was created with the columns from init.sql"""
+        assert table_columns.grouped.get(table) == expected_columns, \
+            table_columns.explain(f"{table.decode()} columns should match init.sql")
     
-    def test_sample_products_inserted(self):
+    def test_sample_products_inserted(self, db_checks):
         """Test that sample products were inserted"""
-        if not TestDatabaseIntegration.db_ready:
-            pytest.skip("Database not available for integration tests")
-        
-        sql_query = "SELECT COUNT(*) FROM products;"
-        
-        result = subprocess.run([
-            "docker-compose", "-f", "docker-compose.yml",
-            "exec", "-T", "postgres",
-            "psql", "-U", "dbuser", "-d", "subscriptions",
-            "-c", sql_query
-        ], capture_output=True, text=True)
-        
-        assert result.returncode == 0, "Query should execute successfully"
-        assert "5" in result.stdout, "Should have 5 sample products"
+        assert db_checks.value(b"products_count") == b"5", db_checks.explain("Should have 5 sample products")
     
-    def test_sample_orders_inserted(self):
+    def test_sample_orders_inserted(self, db_checks):
         """Test that sample orders were inserted"""
-        if not TestDatabaseIntegration.db_ready:
-            pytest.skip("Database not available for integration tests")
-        
-        sql_query = "SELECT COUNT(*) FROM orders;"
-        
-        result = subprocess.run([
-            "docker-compose", "-f", "docker-compose.yml",
-            "exec", "-T", "postgres",
-            "psql", "-U", "dbuser", "-d", "subscriptions",
-            "-c", sql_query
-        ], capture_output=True, text=True)
-        
-        assert result.returncode == 0, "Query should execute successfully"
-        assert "3" in result.stdout, "Should have 3 sample orders"
+        assert db_checks.value(b"orders_count") == b"3", db_checks.explain("Should have 3 sample orders")
     
-    def test_foreign_key_constraint_works(self):
+    def test_foreign_key_constraint_works(self, db_checks):
         """Test that foreign key constraint is enforced"""
-        if not TestDatabaseIntegration.db_ready:
-            pytest.skip("Database not available for integration tests")
-        
-        # Try to insert order with invalid product_id (should fail)
-        sql_query = "INSERT INTO orders (product_id, quantity, total_price) VALUES (999, 1, 10.00);"
-        
-        result = subprocess.run([
-            "docker-compose", "-f", "docker-compose.yml",
-            "exec", "-T", "postgres",
-            "psql", "-U", "dbuser", "-d", "subscriptions",
-            "-c", sql_query
-        ], capture_output=True, text=True)
-        
-        assert result.returncode != 0, "Invalid foreign key should be rejected"
-        assert "violates foreign key constraint" in result.stderr.lower(), "Should show foreign key error"
+        # The batch tries to insert an order with product_id 999 inside a DO block
+        assert db_checks.value(b"fk_violation") == b"raised", db_checks.explain("Invalid foreign key should be rejected")
+    
+    def test_orders_reference_products(self, fk_constraints):
+        """Test that orders.product_id is a foreign key to products.id"""
+        assert (b"orders", b"product_id", b"products", b"id") in fk_constraints.rows, \
+            fk_constraints.explain("orders.product_id should reference products.id")
     
-    def test_database_healthcheck(self):
+    def test_database_healthcheck(self, db_ready):
         """Test that database healthcheck script works"""
-        if not TestDatabaseIntegration.db_ready:
+        if not db_ready:
             pytest.skip("Database not available for integration tests")
         
         result = subprocess.run([
             "docker-compose", "-f", "docker-compose.yml",
             "exec", "-T", "postgres",
             "/usr/local/bin/healthcheck.sh"
-        ], capture_output=True, text=True)
+        ], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
         
         assert result.returncode == 0, "Healthcheck should pass"
-        assert "healthy" in result.stdout.lower(), "Should report database as healthy"
+        assert b"healthy" in result.stdout.lower(), "Should report database as healthy"
 
 
 if __name__ == "__main__":